@@ -1,18 +1,44 @@
-import json
+import asyncio
 import os
-import requests
+import orjson
+import httpx
 from pathlib import Path
+from contextlib import asynccontextmanager
 from datetime import datetime
+from enum import Enum
 
 # Importar o FastAPI, a base do modelo e a sessão do banco
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, BackgroundTasks
+from fastapi.responses import Response
 from .models import Ticket, create_tables, SessionLocal
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session, raiseload
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Mini Inbox Backend")
+# --- EVENTOS DE INICIALIZAÇÃO ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Executa quando o servidor inicia (antes do yield) e quando encerra (depois do yield)."""
+    print("Iniciando o servidor...")
+    # Criação das tabelas e seeding são síncronos: rodam em uma thread para não bloquear o event loop
+    await asyncio.to_thread(create_tables)
+    await asyncio.to_thread(seed_database)
+    # Cliente HTTP assíncrono do n8n, criado a cada inicialização e guardado no app.state
+    # Reutilizado entre os envios (keep-alive): evita um novo handshake TCP/TLS a cada PATCH
+    # e não ocupa uma thread enquanto espera a resposta do n8n
+    app.state.n8n_client = httpx.AsyncClient(
+        timeout=5,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+    )
+    yield
+    # Fecha as conexões mantidas pelo cliente HTTP do n8n
+    await app.state.n8n_client.aclose()
+    app.state.n8n_client = None
+
+# As rotas com response_model são serializadas direto para bytes pelo pydantic-core
+app = FastAPI(title="Mini Inbox Backend", lifespan=lifespan)
 
 # --- CONFIGURAÇÃO CORS ---
 origins = [
@@ -30,8 +56,6 @@ app.add_middleware(
     allow_headers=["*"],                # Permite todos os headers
 )
 
-# --- EVENTOS DE INICIALIZAÇÃO ---
-
 # --- CONFIGURAÇÕES DE CAMINHO ---
 # Pega o caminho para o diretório raiz do projeto (main.py)
 # .parent.parent sobe dois níveis (de backend/ para a raiz do projeto)
@@ -40,6 +64,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Caminhos para os arquivos
 SEEDS_FILE = BASE_DIR / "backend" / "seeds" / "initial_tickets.json"
 METRICS_FILE = BASE_DIR / "data" / "processed" / "metrics.json"
+# Caminho das métricas como str, usado no GET /metrics para evitar o overhead do pathlib a cada requisição
+METRICS_FILE_STR = str(METRICS_FILE)
 
 # --- FUNÇÕES DE SEEDING E CONEXÃO ---
 # Função geradora de dependência pra obter uma sessão de banco de dados
@@ -54,31 +80,31 @@ def get_db():
 def seed_database():
     db = SessionLocal() # Cria uma sessão dedicada para o seeding
     try:
-        # Verifica se já existem tickets no banco
-        if db.query(Ticket).count() == 0:
+        # Verifica se já existem tickets no banco (busca no máximo 1 linha em vez de um COUNT(*))
+        if db.query(Ticket.id).first() is None:
             print("Populando o banco de dados com 20 tickets iniciais...")
             # Verifica se o arquivo de seeds existe
             if not SEEDS_FILE.exists():
                 print(f"ERRO: Arquivo de seeds não encontrado em {SEEDS_FILE}")
                 return
-            # Lê o arquivo JSON com os dados iniciais
-            with open(SEEDS_FILE, 'r', encoding='utf-8') as f:
-                seed_data = json.load(f)
-
-            # Itera sobre cada ticket no arquivo JSON
-            for item in seed_data:
-                # Converte a string ISO de data para objeto datetime
-                created_at_dt = datetime.fromisoformat(item["created_at"])
-                # Cria uma nova instância do modelo Ticket
-                ticket = Ticket(
-                    created_at=created_at_dt,
-                    customer_name=item["customer_name"],
-                    channel=item["channel"],
-                    subject=item["subject"],
-                    status=item["status"],
-                    priority=item["priority"]
-                )
-                db.add(ticket) # Adiciona o ticket à sessão
+            # Lê o arquivo JSON com os dados iniciais (bytes direto para o orjson)
+            seed_data = orjson.loads(SEEDS_FILE.read_bytes())
+
+            # Monta um dict por ticket (uma linha da tabela)
+            rows = [
+                {
+                    # Converte a string ISO de data para objeto datetime
+                    "created_at": datetime.fromisoformat(item["created_at"]),
+                    "customer_name": item["customer_name"],
+                    "channel": item["channel"],
+                    "subject": item["subject"],
+                    "status": item["status"],
+                    "priority": item["priority"],
+                }
+                for item in seed_data
+            ]
+            # Insere todos os tickets com um INSERT do Core (executemany no driver), sem passar pelo ORM
+            db.execute(Ticket.__table__.insert(), rows)
             # Salva todas as mudanças no banco de dados de uma vez
             db.commit()
             print("Seeds inseridos com sucesso!")
@@ -111,12 +137,25 @@ class TicketBase(BaseModel):
         # Sem isso, seria necessário converter manualmente o objeto Ticket para dict
         from_attributes = True
 
+# Valores aceitos para o status de um ticket
+class TicketStatus(str, Enum):
+    OPEN = "open"
+    PENDING = "pending"
+    CLOSED = "closed"
+
+# Valores aceitos para a prioridade de um ticket
+class TicketPriority(str, Enum):
+    LOW = "low"
+    MEDIUM = "medium"
+    HIGH = "high"
+
 # Schema para definir quais campos podem ser atualizados
 class TicketUpdate(BaseModel):
     """Define quais campos podem ser alterados no PATCH."""
     # Usamos Optional, pois o usuário pode querer alterar apenas o status OU a priority
-    status: Optional[str] = None
-    priority: Optional[str] = None
+    # Os Enums fazem o Pydantic rejeitar valores inválidos com 422, antes de chegar ao banco
+    status: Optional[TicketStatus] = None
+    priority: Optional[TicketPriority] = None
 
 # Schema para a resposta da API após atualização
 class TicketResponse(TicketBase):
@@ -126,55 +165,73 @@ class TicketResponse(TicketBase):
     """
     pass # Não adiciona campos novos, apenas reutiliza os de TicketBase
 
-@app.on_event("startup")
-def startup_event():
-    """Executa quando o servidor inicia."""
-    print("Iniciando o servidor...")
-    create_tables()
-    seed_database()
-
 # --- CONFIGURAÇÃO DO N8N ---
 N8N_WEBHOOK_URL = os.environ.get(
     "N8N_WEBHOOK_URL",
     "http://localhost:5678/webhook/f3edc7d6-6ff1-44ee-a2be-475a3e839cc5"
 )
 
-def send_to_n8n(ticket_data: dict):
+async def send_to_n8n(ticket_data: dict):
     """
     Envia o payload de ticket atualizado para o webhook do n8n.
-    Esta função não bloqueia o endpoint principal (aqui é simplificado para não bloquear o response).
+    É executada como BackgroundTask, depois que a resposta do PATCH já foi enviada.
     """
+    # Cliente criado no lifespan; não existe se o servidor não foi inicializado
+    client = getattr(app.state, "n8n_client", None)
+    if client is None:
+        print(f"ERRO: Cliente do n8n não inicializado. Ticket {ticket_data['id']} não enviado.")
+        return
+
     try:
-        # Envia uma requisição POST com JSON convertido para o webhook do n8n
-        response = requests.post(N8N_WEBHOOK_URL, json=ticket_data, timeout=5)
+        # Envia uma requisição POST com o JSON serializado pelo orjson (que já converte datetime para ISO 8601)
+        response = await client.post(
+            N8N_WEBHOOK_URL,
+            content=orjson.dumps(ticket_data),
+            headers={"Content-Type": "application/json"},
+        )
         response.raise_for_status() # Lança erro para status HTTP 4xx/5xx
         print(f"Sucesso: Ticket {ticket_data['id']} enviado para n8n. Status: {response.status_code}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Captura erros de conexão, timeout, etc.
         print(f"ERRO: Falha ao enviar ticket para n8n: {e}")
 
-# Endpoint GET para retornar métricas do dashboard geradas pelo script ETL
-@app.get("/metrics", tags=["Dashboard"])
-def get_metrics():
+# Cache em memória das métricas, invalidado pelo mtime do arquivo
+# Tupla (st_mtime_ns da última leitura, conteúdo bruto do arquivo em bytes), ou None antes da 1ª leitura.
+# mtime e conteúdo ficam juntos e são trocados em uma única atribuição: como as rotas síncronas
+# rodam em paralelo no threadpool, outra thread nunca vê um mtime novo com os bytes antigos (ou None).
+_METRICS_CACHE: Optional[Tuple[int, bytes]] = None
+
+# Dependência que fornece o conteúdo do arquivo de métricas (sobrescrita nos testes)
+def default_metrics_provider() -> bytes:
     """
-    Retorna as métricas prontas geradas pelo script ETL com pandas.
+    Lê o arquivo de métricas gerado pelo ETL e retorna seu conteúdo bruto.
+    O arquivo só é relido e validado quando o ETL o reescreve (mtime diferente do cache).
     """
-    # Verifica se o arquivo de métricas existe
-    if not METRICS_FILE.exists():
+    global _METRICS_CACHE
+    try:
+        # Um único stat verifica se o arquivo existe e fornece o mtime
+        mtime = os.stat(METRICS_FILE_STR).st_mtime_ns
+    except FileNotFoundError:
         # Retorna erro 500 se o arquivo não for encontrado
         raise HTTPException(
             status_code=500, 
             detail="Arquivo de métricas não encontrado. Execute o 'python data/etl.py'."
         )
+
+    # Arquivo não mudou desde a última leitura: devolve os bytes em cache
+    # (lê a tupla uma única vez para comparar e retornar a mesma entrada)
+    cached = _METRICS_CACHE
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
     
     try:
-        # Abre e lê o arquivo JSON com as métricas
-        with open(METRICS_FILE, 'r', encoding='utf-8') as f:
-            metrics_data = json.load(f)
-        # Retorna os dados como resposta JSON
-        return metrics_data
+        # Lê o arquivo JSON com as métricas em bytes
+        with open(METRICS_FILE_STR, 'rb') as f:
+            raw = f.read()
+        # Validação mínima: só garante que o JSON está bem formado
+        orjson.loads(raw)
     
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         # Erro se o JSON estiver malformado
         raise HTTPException(
             status_code=500, 
@@ -184,96 +241,146 @@ def get_metrics():
         # Captura qualquer outro erro inesperado
         raise HTTPException(status_code=500, detail=f"Erro desconhecido: {e}")
 
+    # Atualiza o cache com o conteúdo bruto do arquivo (mtime e bytes em uma única atribuição)
+    _METRICS_CACHE = (mtime, raw)
+    return raw
+
+# Endpoint GET para retornar métricas do dashboard geradas pelo script ETL
+@app.get("/metrics", tags=["Dashboard"])
+def get_metrics(metrics: bytes = Depends(default_metrics_provider)):
+    """
+    Retorna as métricas prontas geradas pelo script ETL com pandas.
+    O arquivo já é JSON válido, então é devolvido como está (sem parse/reserialização).
+    """
+    # Retorna os dados como resposta JSON
+    return Response(content=metrics, media_type="application/json")
+
 # Endpoint GET para listar todos os tickets
 @app.get("/tickets", response_model=List[TicketBase], tags=["Tickets"])
 def list_tickets(
     db: Session = Depends(get_db), # Injeta a sessão do banco via dependência
-    search: Optional[str] = None  # Parâmetro opcional de query string (?search=termo)
+    search: Optional[str] = None,  # Parâmetro opcional de query string (?search=termo)
+    limit: int = Query(100, ge=1, le=500)  # Máximo de tickets retornados (?limit=N)
 ):
     """
-    Lista todos os tickets no banco de dados, com opção de filtrar por termos de busca.
+    Lista os tickets mais recentes (até `limit`, padrão 100), com opção de filtrar por termos de busca.
+    Para buscar um ticket específico use GET /tickets/{ticket_id}.
     A busca é aplicada no assunto (subject) ou no nome do cliente (customer_name).
     
     Exemplos de uso:
-    - GET /tickets → retorna todos os tickets
+    - GET /tickets → retorna os 100 tickets mais recentes
     - GET /tickets?search=Alan retorna tickets com "Alan" no subject ou customer_name
+    - GET /tickets?limit=500 → retorna até 500 tickets (máximo permitido)
     """
 
-    # Cria query base para buscar todos os tickets
-    query = db.query(Ticket) 
+    # Cria query base buscando só as colunas do schema (Rows leves, sem objetos ORM rastreados pela sessão)
+    # Como não há entidades carregadas, não existe lazy load (nem risco de N+1) nesta listagem
+    query = db.query(
+        Ticket.id,
+        Ticket.created_at,
+        Ticket.customer_name,
+        Ticket.channel,
+        Ticket.subject,
+        Ticket.status,
+        Ticket.priority,
+    )
     
     # Lógica de Busca Simples
     if search:
+        # Monta o padrão uma única vez; ele vai como bind parameter (não é concatenado no SQL)
+        pattern = f"%{search}%"
         # Cria um filtro OR (OU): busca no subject OU customer_name (case-insensitive com .ilike)
-        search_filter = Ticket.subject.ilike(f"%{search}%") | \
-                        Ticket.customer_name.ilike(f"%{search}%")
+        search_filter = or_(Ticket.subject.ilike(pattern), Ticket.customer_name.ilike(pattern))
         # Aplica o filtro à query
         query = query.filter(search_filter)
         
     # Ordena por data de criação de forma descendente (mais recentes primeiro)
-    # .desc() = ordem descendente (mais recentes primeiro)
-    # .all() = executa a query e retorna uma lista com todos os resultados
-    tickets = query.order_by(Ticket.created_at.desc()).all()
+    # .desc() = ordem descendente (mais recentes primeiro), atendida pelo índice ix_tickets_created_at_desc
+    # .limit() = retorna só os N primeiros, aproveitando a ordem do índice
+    # .all() = executa a query e retorna uma lista com os resultados
+    tickets = query.order_by(Ticket.created_at.desc()).limit(limit).all()
     
     # Retorna a lista de tickets
-    # O FastAPI e Pydantic convertem automaticamente os objetos ORM para JSON
-    # usando o schema TicketBase definido no response_model
+    # O FastAPI e Pydantic convertem automaticamente as Rows para JSON
+    # usando o schema TicketBase definido no response_model (from_attributes lê os campos por nome)
     return tickets
 
+# Endpoint GET para buscar um único ticket pelo ID
+@app.get("/tickets/{ticket_id}", response_model=TicketResponse, tags=["Tickets"])
+def get_ticket(
+    ticket_id: int,
+    db: Session = Depends(get_db) # Sessão do banco injetada via dependência
+):
+    """
+    Retorna um ticket pelo ID (usado pela página de detalhes do frontend).
+    """
+    # Busca pela chave primária; raiseload("*") impede lazy loads acidentais (N+1)
+    ticket = db.get(Ticket, ticket_id, options=[raiseload("*")])
+    
+    # Se o ticket não existir, retorna erro 404
+    if not ticket:
+        raise HTTPException(status_code=404, detail=f"Ticket com ID {ticket_id} não encontrado.")
+    
+    return ticket
+
 # Endpoint PATCH para atualizar um ticket
 @app.patch("/tickets/{ticket_id}", response_model=TicketResponse, tags=["Tickets"])
 def update_ticket(
     ticket_id: int, 
     update_data: TicketUpdate,
+    background_tasks: BackgroundTasks, # Tarefas executadas após o envio da resposta
     db: Session = Depends(get_db) # Sessão do banco injetada via dependência
 ):
     """
     Atualiza o status ou a prioridade de um ticket e dispara o webhook do n8n.
+    A atualização é feita em um único UPDATE ... RETURNING (sem SELECT antes nem refresh depois).
     """
-    # Buscar o ticket no banco de dados
-    ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
-    
-    # Se o ticket não existir, retorna erro 404
-    if not ticket:
-        raise HTTPException(status_code=404, detail=f"Ticket com ID {ticket_id} não encontrado.")
-    
     # Aplicar as alterações
-    # Rastrea se algum campo foi realmente modificado
-    changes_made = False
-
-    # Atualiza o status se foi fornecido na requisição
-    # if update_data.status not in ["open", "pending", "closed"]: raise HTTPException(400, "Status inválido")
-    if update_data.status is not None:
-        # AQUI VOCÊ PODE ADICIONAR VALIDAÇÃO (ex: status in ["open", "pending", "closed"])
-        ticket.status = update_data.status
-        changes_made = True
-    
-    # Atualiza a prioridade se foi fornecida na requisição
-    # if update_data.priority not in ["low", "medium", "high"]: raise HTTPException(400, "Prioridade inválida")
-    if update_data.priority is not None:
-        # AQUI VOCÊ PODE ADICIONAR VALIDAÇÃO (ex: priority in ["low", "medium", "high"])
-        ticket.priority = update_data.priority
-        changes_made = True
+    # Só os campos enviados na requisição (os None são ignorados)
+    # mode="json" converte os Enums para as strings gravadas no banco
+    values = update_data.model_dump(mode="json", exclude_none=True)
 
     # Se nenhum campo foi enviado para atualização (body vazio: {})    
-    if not changes_made:
+    if not values:
+        # Buscar o ticket pela chave primária (consulta o identity map da sessão antes de ir ao banco)
+        # raiseload("*"): qualquer lazy load acidental de relacionamento lança erro em vez de gerar N+1
+        ticket = db.get(Ticket, ticket_id, options=[raiseload("*")])
+        # Se o ticket não existir, retorna erro 404
+        if not ticket:
+            raise HTTPException(status_code=404, detail=f"Ticket com ID {ticket_id} não encontrado.")
         # Retorna o ticket sem alterações
         return ticket
 
+    # Atualiza e retorna o ticket na mesma ida ao banco
+    stmt = (
+        update(Ticket)
+        .where(Ticket.id == ticket_id)
+        .values(**values)
+        .returning(Ticket)
+    )
+    ticket = db.execute(stmt).scalar_one_or_none()
     
-    db.commit() # Salva as alterações no banco
-    db.refresh(ticket)
+    # Se o ticket não existir, nenhuma linha é atualizada: retorna erro 404
+    if ticket is None:
+        raise HTTPException(status_code=404, detail=f"Ticket com ID {ticket_id} não encontrado.")
     
-    # Converte o objeto ORM (ticket) para o formato JSON/dict
-    ticket_dict = TicketResponse.model_validate(ticket).model_dump()
+    # Monta o payload direto dos atributos do ticket (sem validar/serializar via Pydantic)
+    # Montado antes do commit, que expira o objeto e forçaria um novo SELECT
+    # O created_at continua como datetime: o orjson serializa para ISO 8601 no send_to_n8n
+    ticket_dict = {
+        "id": ticket.id,
+        "created_at": ticket.created_at,
+        "customer_name": ticket.customer_name,
+        "channel": ticket.channel,
+        "subject": ticket.subject,
+        "status": ticket.status,
+        "priority": ticket.priority,
+    }
 
-    # Serializa a data de criação para string ISO 8601
-    if 'created_at' in ticket_dict and isinstance(ticket_dict['created_at'], datetime):
-        # Converte o objeto datetime para uma string ISO 8601 (o formato ideal para JSON)
-        ticket_dict['created_at'] = ticket_dict['created_at'].isoformat()
+    db.commit() # Salva as alterações no banco
     
-    # Envia o payload para o n8n
-    send_to_n8n(ticket_dict)
+    # Agenda o envio do payload para o n8n sem atrasar a resposta ao cliente
+    background_tasks.add_task(send_to_n8n, ticket_dict)
 
     # Retorna o ticket atualizado
-    return ticket
+    return ticket_dict
@@ -1,5 +1,5 @@
 # Importações do SQLAlchemy para trabalhar com banco de dados
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Index, DDL, event
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timezone
@@ -26,6 +26,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = sqlalchemy.orm.declarative_base()
 
 # Define o modelo da tabela tickets
+# Ao adicionar relacionamentos (ex: agentes, comentários), carregue-os explicitamente nas queries:
+# selectinload para 1:N (coleções) e joinedload para N:1 (objeto único), evitando o problema N+1.
 class Ticket(Base):
     __tablename__ = "tickets"
 
@@ -45,6 +47,47 @@ class Ticket(Base):
     def __repr__(self):
         return f"<Ticket(id={self.id}, subject='{self.subject}', status='{self.status}', priority='{self.priority}')>"
 
+# --- ÍNDICES ---
+# Índice na ordenação padrão da listagem (mais recentes primeiro):
+# evita ordenar a tabela inteira e permite buscar só os N primeiros
+# No PostgreSQL não é criado: o ix_tickets_list_covering (abaixo) tem a mesma chave
+Index("ix_tickets_created_at_desc", Ticket.created_at.desc()).ddl_if(
+    callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != "postgresql"
+)
+
+# --- ÍNDICES DE BUSCA ---
+# A busca do GET /tickets usa ILIKE '%termo%', que não aproveita índices B-tree.
+# No PostgreSQL, índices GIN de trigramas (pg_trgm) atendem esse tipo de filtro.
+# No SQLite (banco padrão do projeto) esses índices não existem e não são criados.
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+Index(
+    "ix_tickets_subject_trgm",
+    Ticket.subject,
+    postgresql_using="gin",
+    postgresql_ops={"subject": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+Index(
+    "ix_tickets_customer_name_trgm",
+    Ticket.customer_name,
+    postgresql_using="gin",
+    postgresql_ops={"customer_name": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
+# Índice de cobertura para a listagem/busca no PostgreSQL: a ordenação por created_at DESC
+# e as colunas retornadas (INCLUDE) saem direto do índice (Index Only Scan, sem acessar a tabela).
+# Conferir o plano com EXPLAIN (ANALYZE, BUFFERS).
+Index(
+    "ix_tickets_list_covering",
+    Ticket.created_at.desc(),
+    postgresql_include=["id", "customer_name", "channel", "subject", "status", "priority"],
+).ddl_if(dialect="postgresql")
+
 # Função para criar as tabelas no banco de dados
 def create_tables():
     """Cria o arquivo db.sqlite e as tabelas definidas no Base."""
@@ -1,13 +1,12 @@
+import os
 import pytest
-import json
-from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
 # Importações do projeto
-from backend.main import app, get_db
+from backend.main import app, get_db, default_metrics_provider
 from backend.models import Base, Ticket
 from datetime import datetime, timezone
 
@@ -71,11 +70,27 @@ def setup_db_with_tickets():
 
     # Continuação do /backend/tests/test_api.py
 
+# 5. Fixture que captura o SQL enviado ao banco de teste (para detectar N+1)
+@pytest.fixture
+def captured_sql():
+    """Registra cada comando SQL executado no engine de teste durante o teste."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
 def test_get_metrics_success(monkeypatch):
     """Testa se o GET /metrics retorna 200 e os dados esperados."""
-    # Como o endpoint lê um arquivo, simulamos a leitura do arquivo e a existência do arquivo.
-    monkeypatch.setattr(json, 'load', lambda f: {"total_tickets": 100, "tickets_by_day": []})
-    monkeypatch.setattr(Path, 'exists', lambda self: True)
+    # Substitui a leitura do arquivo de métricas por um provider falso (restaurado ao fim do teste)
+    monkeypatch.setitem(
+        app.dependency_overrides,
+        default_metrics_provider,
+        lambda: b'{"total_tickets": 100, "tickets_by_day": []}',
+    )
     
     response = client.get("/metrics")
     
@@ -83,6 +98,49 @@ def test_get_metrics_success(monkeypatch):
     assert response.json()["total_tickets"] == 100
 
 
+@pytest.fixture
+def metrics_file(monkeypatch, tmp_path):
+    """Aponta o provider de métricas para um arquivo temporário, com o cache vazio."""
+    path = tmp_path / "metrics.json"
+    monkeypatch.setattr('backend.main.METRICS_FILE_STR', str(path))
+    monkeypatch.setattr('backend.main._METRICS_CACHE', None)
+    return path
+
+
+def test_get_metrics_file_not_found(metrics_file):
+    """Testa se o GET /metrics retorna 500 quando o ETL ainda não gerou o arquivo."""
+    response = client.get("/metrics")
+    
+    assert response.status_code == 500
+    assert "não encontrado" in response.json()["detail"]
+
+
+def test_get_metrics_invalid_json(metrics_file):
+    """Testa se o GET /metrics retorna 500 quando o arquivo tem JSON malformado."""
+    metrics_file.write_bytes(b'{"total_tickets": ')
+    
+    response = client.get("/metrics")
+    
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Erro ao ler o arquivo de métricas. JSON inválido."
+
+
+def test_get_metrics_cached_until_mtime_changes(metrics_file):
+    """Testa se o arquivo só é relido quando o mtime muda."""
+    metrics_file.write_bytes(b'{"total_tickets": 1}')
+    assert client.get("/metrics").json()["total_tickets"] == 1
+    
+    # Reescreve o conteúdo mantendo o mesmo mtime: deve continuar servindo o cache
+    stat = os.stat(metrics_file)
+    metrics_file.write_bytes(b'{"total_tickets": 2}')
+    os.utime(metrics_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert client.get("/metrics").json()["total_tickets"] == 1
+    
+    # Com um mtime novo (como após rodar o ETL) o arquivo é relido
+    os.utime(metrics_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert client.get("/metrics").json()["total_tickets"] == 2
+
+
 def test_list_tickets_all(setup_db_with_tickets):
     """Testa se o GET /tickets retorna todos os 2 tickets de teste."""
     response = client.get("/tickets")
@@ -92,6 +150,49 @@ def test_list_tickets_all(setup_db_with_tickets):
     assert response.json()[0]["customer_name"] == "Test Emily" # Deve estar ordenado por data descendente
 
 
+def test_list_tickets_single_query(setup_db_with_tickets, captured_sql):
+    """Testa se o GET /tickets faz um único SELECT (sem consultas extras por ticket)."""
+    response = client.get("/tickets")
+    
+    assert response.status_code == 200
+    selects = [sql for sql in captured_sql if sql.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1
+
+
+def test_list_tickets_limit(setup_db_with_tickets):
+    """Testa se o ?limit=N limita a quantidade de tickets (mantendo os mais recentes)."""
+    response = client.get("/tickets?limit=1")
+    
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.json()[0]["customer_name"] == "Test Emily"
+
+
+@pytest.mark.parametrize("limit", [0, 501])
+def test_list_tickets_limit_out_of_range(limit):
+    """Testa se valores de limit fora de 1..500 são rejeitados com 422."""
+    response = client.get(f"/tickets?limit={limit}")
+    
+    assert response.status_code == 422
+
+
+def test_get_ticket(setup_db_with_tickets):
+    """Testa o GET /tickets/{id} para um ticket existente."""
+    response = client.get("/tickets/2")
+    
+    assert response.status_code == 200
+    assert response.json()["id"] == 2
+    assert response.json()["customer_name"] == "Test Emily"
+
+
+def test_get_ticket_not_found():
+    """Testa o GET /tickets/{id} quando o ticket não existe."""
+    response = client.get("/tickets/999")
+    
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Ticket com ID 999 não encontrado."
+
+
 def test_list_tickets_search(setup_db_with_tickets):
     """Testa a funcionalidade de busca."""
     response = client.get("/tickets?search=Alan")
@@ -107,14 +208,54 @@ def test_patch_ticket_status_update(setup_db_with_tickets, monkeypatch):
     ticket_id = 1
     new_status = "pending"
     
-    # Mock do envio do n8n para não falhar
-    monkeypatch.setattr('backend.main.send_to_n8n', lambda ticket_data: None, raising=False)
+    # Mock do envio do n8n: registra os payloads em vez de enviar
+    sent_payloads = []
+    monkeypatch.setattr('backend.main.send_to_n8n', sent_payloads.append)
     
     response = client.patch(f"/tickets/{ticket_id}", json={"status": new_status})
     
     assert response.status_code == 200
     assert response.json()["status"] == new_status
     assert response.json()["priority"] == "high" # Prioridade não mudou
+    
+    # O TestClient executa as BackgroundTasks antes de devolver a resposta
+    assert len(sent_payloads) == 1
+    payload = sent_payloads[0]
+    assert payload["id"] == ticket_id
+    assert payload["customer_name"] == "Test Alan"
+    assert payload["status"] == new_status
+    assert payload["priority"] == "high"
+    # O created_at segue como datetime (o orjson o serializa no envio) e bate com o da resposta
+    assert isinstance(payload["created_at"], datetime)
+    assert payload["created_at"] == datetime.fromisoformat(response.json()["created_at"])
+
+
+def test_patch_ticket_invalid_status(setup_db_with_tickets):
+    """Testa o PATCH /tickets/{id} com um status fora dos valores aceitos."""
+    response = client.patch("/tickets/1", json={"status": "archived"})
+    
+    assert response.status_code == 422
+
+
+def test_patch_ticket_empty_body(setup_db_with_tickets, monkeypatch):
+    """Testa o PATCH /tickets/{id} sem campos: retorna o ticket sem alterações e sem disparar o n8n."""
+    sent_payloads = []
+    monkeypatch.setattr('backend.main.send_to_n8n', sent_payloads.append)
+    before = client.get("/tickets?search=Emily").json()[0]
+    
+    response = client.patch(f"/tickets/{before['id']}", json={})
+    
+    assert response.status_code == 200
+    assert response.json() == before
+    assert sent_payloads == []
+
+
+def test_patch_ticket_empty_body_not_found():
+    """Testa o PATCH /tickets/{id} sem campos quando o ticket não existe."""
+    response = client.patch("/tickets/999", json={})
+    
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Ticket com ID 999 não encontrado."
 
 
 def test_patch_ticket_not_found():
@@ -123,3 +264,15 @@ def test_patch_ticket_not_found():
     
     assert response.status_code == 404
     assert response.json()["detail"] == "Ticket com ID 999 não encontrado."
+
+
+def test_lifespan_recreates_n8n_client(monkeypatch):
+    """Testa se cada inicialização do servidor cria um cliente do n8n novo (e aberto)."""
+    # Evita criar tabelas/seeds no banco real durante o lifespan
+    monkeypatch.setattr('backend.main.create_tables', lambda: None)
+    monkeypatch.setattr('backend.main.seed_database', lambda: None)
+    
+    for _ in range(2):
+        with TestClient(app):
+            assert not app.state.n8n_client.is_closed
+        assert app.state.n8n_client is None
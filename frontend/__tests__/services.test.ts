@@ -6,7 +6,7 @@ jest.mock('@/lib/api', () => ({
   },
 }));
 
-import { fetchMetrics } from '@/lib/services';
+import { fetchMetrics, fetchTicketDetails } from '@/lib/services';
 import { api } from '@/lib/api';
 
 describe('fetchMetrics', () => {
@@ -19,4 +19,21 @@ describe('fetchMetrics', () => {
     // Verifica se a função de fetch foi chamada com o endpoint correto
     expect(api.get).toHaveBeenCalledWith('/metrics'); 
   });
-});
\ No newline at end of file
+});
+
+describe('fetchTicketDetails', () => {
+  it('Função fetchTicketDetails deve chamar api.get com o caminho /tickets/{id}', async () => {
+    (api.get as jest.Mock).mockResolvedValue({ id: 7 });
+
+    const ticket = await fetchTicketDetails(7);
+
+    expect(api.get).toHaveBeenCalledWith('/tickets/7');
+    expect(ticket).toEqual({ id: 7 });
+  });
+
+  it('Função fetchTicketDetails deve retornar null quando o ticket não existe (404)', async () => {
+    (api.get as jest.Mock).mockRejectedValue(new Error('GET /tickets/999 failed with status 404: {}'));
+
+    await expect(fetchTicketDetails(999)).resolves.toBeNull();
+  });
+});
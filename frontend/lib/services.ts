@@ -20,10 +20,14 @@ export async function updateTicket(id: number, data: { status?: 'open' | 'closed
 
 // Função para buscar um único ticket por ID no frontend
 export async function fetchTicketDetails(id: number): Promise<Ticket | null> {
-    // Busca todos os tickets 
-    const allTickets = await api.get<Ticket[]>("/tickets"); 
-    // Filtra para encontrar o ticket com o ID correspondente
-    const ticket = allTickets.find(t => t.id === id);
-
-    return ticket || null;
+    try {
+        // Busca o ticket direto pelo endpoint /tickets/{id} (a listagem é limitada aos mais recentes)
+        return await api.get<Ticket>(`/tickets/${id}`);
+    } catch (err) {
+        // 404: o ticket não existe
+        if (err instanceof Error && err.message.includes("status 404")) {
+            return null;
+        }
+        throw err;
+    }
 }
\ No newline at end of file